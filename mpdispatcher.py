@@ -1,10 +1,79 @@
 import asyncio
+from collections import deque
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor
 import multiprocessing as mp
+from multiprocessing.reduction import ForkingPickler
+import os
+import pickle
 import queue
+import struct
+from time import monotonic
+import weakref
 
-CLOSE_SENTINEL = "CLOSE"
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+class _Sentinel:
+    """
+    Type of module-level sentinel objects like `CLOSE_SENTINEL`.
+
+    Pickles by reference to the module-level name given on construction, so
+    unpickling one in any process yields that process's singleton and it can
+    be checked for by identity.
+    """
+    __slots__ = ("_name",)
+
+    def __init__(self, name):
+        self._name = name
+
+    def __reduce__(self):
+        return self._name
+
+    def __repr__(self):
+        return self._name
+
+CLOSE_SENTINEL = _Sentinel("CLOSE_SENTINEL")
+
+# takes the place of kwargs in events sent by fire_many(), whose args are then
+# a list of positional argument tuples, one for each event (being truthy, it
+# keeps these off the dispatch fast paths for events without kwargs)
+_BATCH_MARKER = _Sentinel("_BATCH_MARKER")
+
+# types of event arguments for which pickled events may be cached; restricted
+# to exact types whose equal instances also pickle identically (which e.g.
+# isn't the case for 0.0 and -0.0 or for 1 and True, hence the type check)
+_CACHEABLE_ARG_TYPES = frozenset((str, bytes, int, bool, type(None)))
+
+# pickled events are only cached up to this size and number, so events with
+# large arguments can't make the cache hold on to lots of memory
+_MAX_CACHED_EVENT_SIZE = 512
+_MAX_CACHED_EVENTS = 256
+_encoded_events = {}
+
+def _encode(signal, args, kwargs_items, types):
+    key = (signal, args, kwargs_items, types)
+    data = _encoded_events.get(key)
+    if data is None:
+        data = pickle.dumps(
+            (signal, args, dict(kwargs_items)), protocol=pickle.HIGHEST_PROTOCOL
+        )
+        if len(data) <= _MAX_CACHED_EVENT_SIZE:
+            if len(_encoded_events) >= _MAX_CACHED_EVENTS:
+                # evict the oldest entry
+                del _encoded_events[next(iter(_encoded_events))]
+            _encoded_events[key] = data
+    return data
+
+# PipeQueue messages that aren't plain pickles (which always start with
+# pickle's PROTO opcode, b"\x80") start with a header of one of these frame
+# types followed by a schema ID
+_FRAME_STRUCT = 1
+_FRAME_SCHEMA = 2
+_FRAME_HEADER = struct.Struct("<BH")
+_MAX_SCHEMA_ID = 0xFFFF
 
 class MpDispatcher:
     """
@@ -14,10 +83,29 @@ class MpDispatcher:
     should work, but of course listeners *won't* be synchronized across process
     boundaries! So only use `receiver.connect()` on the side on which the
     callbacks should actually run, otherwise things get confusing.
+
+    `mode` selects the transport used when no `q` is given: `"mpmc"` (the
+    default) uses a `multiprocessing.Queue`, which is safe for any number of
+    senders and receivers, while `"spsc"` uses a `PipeQueue`, which is faster
+    but only suitable for a single sending and a single receiving process.
+    `"ring"` uses a bounded `SpscRingTransport` for the same single-sender,
+    single-receiver scenario, falling back to a `multiprocessing.Queue` on
+    Python versions without shared memory support.
     """
-    def __init__(self, q=None):
+    __slots__ = ("receiver", "sender")
+
+    def __init__(self, q=None, mode="mpmc"):
+        if mode not in ("mpmc", "spsc", "ring"):
+            raise ValueError(f"unknown mode: {mode!r}")
         if q is None:
-            q = mp.Queue()
+            if mode == "spsc":
+                q = PipeQueue()
+            elif mode == "ring" and shared_memory is not None:
+                q = SpscRingTransport()
+            else:
+                q = mp.Queue()
+        elif mode != "mpmc":
+            raise ValueError("mode can't be combined with an explicit q")
         self.receiver = MpDispatchReceiver(q=q)
         self.sender = MpDispatchSender(q=q)
 
@@ -28,21 +116,102 @@ class MpDispatchSender:
     Can be used to `fire()` signals/events, which will be put into the queue on
     which the corresponding receiving end listens.
     """
+    __slots__ = ("q", "closed", "_schemas", "_next_schema_id")
+
     def __init__(self, q=None):
         self.q = q
         self.closed = False
+        self._schemas = {}
+        self._next_schema_id = 0
+
+    def register_schema(self, signal, struct_fmt):
+        """
+        Register a `struct` format for the positional arguments of a signal.
+
+        Events of that signal fired without keyword arguments are then sent as
+        packed structs instead of being pickled, which is a lot cheaper. The
+        arguments are converted as `struct.pack()` would, e.g. `True` arrives
+        as `1` for a `"i"` format. Events whose arguments don't fit the format
+        fall back to pickling. Registering a signal again replaces its schema
+        and assigns it a new ID.
+
+        Returns the ID assigned to the schema, or `None` if the underlying
+        queue doesn't support schemas (only `PipeQueue` and
+        `SpscRingTransport` do), in which case events of this signal will
+        simply continue to be pickled.
+        """
+        put_bytes = getattr(self.q, "put_bytes", None)
+        if put_bytes is None:
+            return None
+        # IDs are never reused, as the receiving end may still get events
+        # sent under an ID's previous schema
+        sig_id = self._next_schema_id
+        if sig_id > _MAX_SCHEMA_ID:
+            raise ValueError(
+                f"can't register more than {_MAX_SCHEMA_ID + 1} schemas"
+            )
+        self._next_schema_id += 1
+        put_bytes(
+            _FRAME_HEADER.pack(_FRAME_SCHEMA, sig_id)
+            + pickle.dumps((signal, struct_fmt))
+        )
+        self._schemas[signal] = (
+            _FRAME_HEADER.pack(_FRAME_STRUCT, sig_id), struct_fmt
+        )
+        return sig_id
 
     def fire(self, signal, *args, **kwargs):
         """
         Fire off an event.
+
+        If the underlying queue supports sending pre-pickled events (like
+        `PipeQueue` does), pickled events with small, simple arguments are
+        cached, so firing the same event repeatedly doesn't have to pickle it
+        every time. The cache lookup isn't free, though: for events that never
+        repeat, it makes firing up to about 25% slower than without it, in
+        which case `register_schema()` may be the better choice.
         """
+        put_bytes = getattr(self.q, "put_bytes", None)
+        if put_bytes is not None:
+            schema = self._schemas.get(signal)
+            if schema is not None and not kwargs:
+                header, struct_fmt = schema
+                try:
+                    put_bytes(header + struct.pack(struct_fmt, *args))
+                    return
+                except struct.error:
+                    pass
+            # kept in call order (not sorted) so listeners taking **kwargs see
+            # the same order as with uncached events
+            kwargs_items = tuple(kwargs.items())
+            types = tuple(map(type, args + tuple(v for _, v in kwargs_items)))
+            if _CACHEABLE_ARG_TYPES.issuperset(types) and type(signal) is str:
+                put_bytes(_encode(signal, args, kwargs_items, types))
+                return
         self.q.put((signal, args, kwargs))
 
+    def fire_many(self, signal, args_list):
+        """
+        Fire off one event per item of `args_list` at once.
+
+        Each item is a tuple of positional arguments for one event. All events
+        are sent as a single queue item, so they're pickled and transmitted in
+        one go, which is much cheaper than firing them one by one.
+        """
+        self.q.put((signal, list(args_list), _BATCH_MARKER))
+
     def close(self, **q_put_kwargs):
         """
         Closes the underlying queue and aborts any blocking calls.
+
+        Calling this more than once has no further effect, unless putting the
+        close request into the queue failed (e.g. with `queue.Full` due to a
+        timeout passed in `q_put_kwargs`).
         """
+        if self.closed:
+            return
         self.q.put(CLOSE_SENTINEL, **q_put_kwargs)
+        self.closed = True
 
 
 class MpDispatchReceiver:
@@ -52,25 +221,153 @@ class MpDispatchReceiver:
     Can be used to `connect()` signal names to functions (listeners), which
     will be called when a signal of that name arrives.
     """
+    __slots__ = (
+        "listeners", "_single", "q", "closed", "_close_sent", "_executor",
+        "_dispatch",
+    )
+
     def __init__(self, q=None):
         self.listeners = {}
+        if isinstance(q, _FramedQueue):
+            q._wanted = self.listeners
+        # signals with exactly one listener, for a faster dispatch path
+        # (always a subset of self.listeners)
+        self._single = {}
         self.q = q
         self.closed = False
+        self._close_sent = False
+        self._executor = None
+        # replaced by a specialized version by finalize()
+        self._dispatch = self._dispatch_generic
+
+    def __getstate__(self):
+        # slots of all classes in the hierarchy plus the instance dict of
+        # subclasses that don't define __slots__ themselves
+        state = dict(getattr(self, "__dict__", ()))
+        for cls in type(self).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            for name in slots:
+                if name not in ("__dict__", "__weakref__", "_dispatch") \
+                   and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        # executors can't be pickled and their threads wouldn't carry over to
+        # another process anyway
+        state["_executor"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._dispatch = self._dispatch_generic
+        if isinstance(self.q, _FramedQueue):
+            self.q._wanted = self.listeners
+
+    def _get_executor(self):
+        """
+        Returns this receiver's executor for blocking waits, creating it first
+        if necessary.
+
+        A single worker suffices as there is never more than one blocking wait
+        per receiver at a time.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="mpdispatcher"
+            )
+        return self._executor
+
+    def _shutdown_executor(self):
+        """
+        Shuts down this receiver's executor, if any, without waiting for it.
+
+        A new one is created if it's needed again later on.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def connect(self, signal, cb):
-        if signal not in self.listeners:
-            self.listeners[signal] = []
-        self.listeners[signal].append(cb)
+        listeners = self.listeners.setdefault(signal, [])
+        listeners.append(cb)
+        if len(listeners) == 1:
+            self._single[signal] = cb
+        else:
+            self._single.pop(signal, None)
+        self._dispatch = self._dispatch_generic
+
+    def finalize(self):
+        """
+        Specializes event dispatching for the currently connected listeners.
+
+        Generates a dispatch function that checks for each connected signal in
+        turn and calls its listeners directly, which is faster than the
+        generic dictionary lookups and loops for receivers with a handful of
+        signals. Meant to be called once all listeners are connected, before
+        handling events. Connecting further listeners reverts to generic
+        dispatching until this is called again. Also doesn't carry over when
+        the receiver is pickled, so call it in the receiving process.
+        """
+        namespace = {
+            "_generic": self._dispatch_generic,
+            "_batch_marker": _BATCH_MARKER,
+        }
+        lines = [
+            "def dispatch(obj):",
+            "    signal, args, kwargs = obj",
+            "    if kwargs is _batch_marker:",
+            "        return _generic(obj)",
+        ]
+        for i, (signal, listeners) in enumerate(self.listeners.items()):
+            namespace[f"_s{i}"] = signal
+            names = [f"_l{i}_{j}" for j in range(len(listeners))]
+            namespace.update(zip(names, listeners))
+            lines.append(f"    if signal == _s{i}:")
+            lines.append("        if kwargs:")
+            lines.extend(f"            {name}(*args, **kwargs)" for name in names)
+            lines.append("        else:")
+            lines.extend(f"            {name}(*args)" for name in names)
+            lines.append("        return")
+        exec("\n".join(lines), namespace)
+        self._dispatch = namespace["dispatch"]
+
+    def _recv_raw(self, **q_get_kwargs):
+        """
+        Gets the next object from the queue, returning `None` if it's the
+        close sentinel.
 
-    def _handle_received(self, obj):
-        if obj == CLOSE_SENTINEL:
+        This is the only place besides the inlined loops below where the
+        sentinel is checked for, and `self.closed` is always set right here in
+        whichever thread does the waiting. That's important because
+        `handle_until_closed()` may be run in a separate listening thread (via
+        `threaded_handle_until_closed()`), which has to see `self.closed` to
+        return, while the events themselves are dispatched in the original
+        thread via `call_via`.
+        """
+        obj = self.q.get(**q_get_kwargs)
+        if obj is CLOSE_SENTINEL:
             self.closed = True
-            return
+            return None
+        return obj
+
+    def _dispatch_generic(self, obj):
         # TODO exception isolation perhaps
         signal, args, kwargs = obj
-        if signal not in self.listeners:
+        cb = self._single.get(signal)
+        if cb is not None and not kwargs:
+            if args:
+                cb(*args)
+            else:
+                cb()
             return
-        for listener in self.listeners[signal]:
+        listeners = self.listeners.get(signal, ())
+        if kwargs is _BATCH_MARKER:
+            for batch_args in args:
+                for listener in listeners:
+                    listener(*batch_args)
+            return
+        for listener in listeners:
             listener(*args, **kwargs)
 
     def handle_next(self, call_via=None, **q_get_kwargs):
@@ -78,39 +375,24 @@ class MpDispatchReceiver:
         Waits for the next incoming event and handles it by dispatching.
 
         If `call_via` is not `None`, it's expected to be a callable that will
-        be passed the event processing function and should make sure that the
-        latter gets called from whichever thread or process originally called
-        `handle_next()`. Most likely you won't ever use this directly but via
+        be passed the event processing function and its arguments and should
+        make sure that the former gets called with the latter from whichever
+        thread or process originally called `handle_next()`, like
+        `loop.call_soon_threadsafe` in asyncio or `idle_add` in Glib do. Most
+        likely you won't ever use this directly but via
         `threaded_handle_until_closed()`.
 
         Blocking unless otherwise specified in `q_get_kwargs`
         """
         if self.closed:
             raise Closed()
-        obj = self.q.get(**q_get_kwargs)
-        # NOTE: the close handling below is NOT superfluous just because it
-        # also appears in _handle_received. When using
-        # threaded_handle_until_closed, _handle_received will be called in the
-        # original thread, while the loop for queue listening via
-        # handle_until_closed (which calls this function here) will be
-        # performed in a separate listening thread. It's important that
-        # self.closed gets set in the listening thread so handle_until_closed
-        # returns. When using coro_handle_until_closed, by contrast, the loop
-        # condition is checked in the main thread and only the individual queue
-        # listening iterations are done in the separate thread (made possible
-        # via cooperative multitasking), so for that one we do need to set
-        # self.closed in the original thread. Hence, both are required until I
-        # change the architecture to e.g. have the non-coroutine version
-        # emulate the coroutine version by scheduling the next listening
-        # iteration from the original thread at the end of each
-        # _handle_received instead of threading the whole loop, or something
-        # like that.
-        if obj == CLOSE_SENTINEL:
-            self.closed = True
+        obj = self._recv_raw(**q_get_kwargs)
+        if obj is None:
+            return
         if call_via is None:
-            self._handle_received(obj)
+            self._dispatch(obj)
         else:
-            call_via(partial(self._handle_received, obj))
+            call_via(self._dispatch, obj)
 
     def handle_until_blocking(self):
         """
@@ -119,14 +401,24 @@ class MpDispatchReceiver:
         You should know exactly what you're doing when deciding to use this, as
         it's an easy way to get race conditions. The sensible use cases are
         fairly limited.
+
+        Raises `Closed` if the receiver is or becomes closed, i.e. if the close
+        sentinel is encountered among the events.
         """
+        if self.closed:
+            raise Closed()
+        get_nowait = self.q.get_nowait
         while True:
             try:
-                self.handle_next(block=False)
+                obj = get_nowait()
             except queue.Empty:
-                break
+                return
+            if obj is CLOSE_SENTINEL:
+                self.closed = True
+                raise Closed()
+            self._dispatch(obj)
 
-    async def coro_handle_next(self, pool, **q_get_kwargs):
+    async def coro_handle_next(self, pool=None, **q_get_kwargs):
         """
         Like handle_next() but async by waiting in a separate thread.
 
@@ -138,25 +430,80 @@ class MpDispatchReceiver:
         `pool` should be a `ThreadPoolExecutor` (the whole point of these is
         re-use, so it wouldn't make any sense for this method to allocate a new
         one on each call that then gets used only once, and I'm too lazy to
-        have instances of this class cache them).
+        have instances of this class cache them). If it's `None`, the event
+        loop's default executor is used.
+
+        If an event is already waiting in the queue, it's handled without
+        going through the executor at all.
         """
         if self.closed:
             raise Closed()
-        loop = asyncio.get_running_loop()
-        obj = await loop.run_in_executor(
-            pool, partial(self.q.get, **q_get_kwargs)
-        )
-        self._handle_received(obj)
+        try:
+            obj = self._recv_raw(block=False)
+        except queue.Empty:
+            loop = asyncio.get_running_loop()
+            recv = partial(self._recv_raw, **q_get_kwargs) if q_get_kwargs \
+                else self._recv_raw
+            obj = await loop.run_in_executor(pool, recv)
+        else:
+            # still yield to the event loop so a steady stream of events
+            # can't starve other tasks
+            await asyncio.sleep(0)
+        if obj is not None:
+            self._dispatch(obj)
 
     def handle_until_closed(self, call_via=None):
         """
         Waits for incoming events in a blocking manner and handles them.
 
         Cf. `handle_next()` and `threaded_handle_until_closed()` for
-        explanation of `call_via`.
+        explanation of `call_via`. If events arrive faster than the original
+        thread gets around to handling them, they're handled in batches, with
+        only one call scheduled via `call_via` per batch.
         """
+        if call_via is not None:
+            # rather than scheduling one call per event, received events are
+            # collected in `pending` and only the first one of each burst
+            # schedules a call to drain(), which then handles all events that
+            # have accumulated by the time it runs
+            pending = deque()
+
+            def drain():
+                try:
+                    while pending:
+                        self._dispatch(pending.popleft())
+                finally:
+                    # if a listener raised, the remaining events would
+                    # otherwise be stuck, as only the first event of a burst
+                    # schedules a call
+                    if pending:
+                        call_via(drain)
+
+            recv = self._recv_raw
+            while not self.closed:
+                obj = recv()
+                if obj is None:
+                    return
+                pending.append(obj)
+                if len(pending) == 1:
+                    call_via(drain)
+            return
+        # this is the receiver's hot loop, so the common case of a signal with
+        # a single listener and no kwargs is dispatched inline here instead of
+        # going through _dispatch()
+        get = self.q.get
+        get_single = self._single.get
         while not self.closed:
-          self.handle_next(call_via=call_via)
+            obj = get()
+            if obj is CLOSE_SENTINEL:
+                self.closed = True
+                return
+            signal, args, kwargs = obj
+            cb = get_single(signal)
+            if cb is not None and not kwargs:
+                cb(*args)
+            else:
+                self._dispatch(obj)
 
     def threaded_handle_until_closed(self, call_via, executor=None):
         """
@@ -167,10 +514,59 @@ class MpDispatchReceiver:
         e.g. `idle_add` in Glib or `loop.call_soon_threadsafe` in asyncio. See
         the section on "guest mode" in [1], where I stole this idea from.
 
+        If `executor` is `None`, the receiver's own single-thread executor is
+        used, which is created on first use and shut down once the receiver
+        has been closed.
+
         [1]: https://trio.readthedocs.io/en/stable/reference-lowlevel.html .
         """
-        self._executor = executor or ThreadPoolExecutor()
-        self._executor.submit(self.handle_until_closed, call_via=call_via)
+        if executor is None:
+            self._get_executor().submit(
+                self._handle_until_closed_and_shutdown_executor, call_via
+            )
+        else:
+            executor.submit(self.handle_until_closed, call_via=call_via)
+
+    def _handle_until_closed_and_shutdown_executor(self, call_via):
+        self.handle_until_closed(call_via=call_via)
+        self._shutdown_executor()
+
+    def asyncio_handle_until_closed(self, loop):
+        """
+        Like threaded_handle_until_closed() but without a listening thread.
+
+        Instead, the file descriptor of the queue's underlying pipe is
+        registered with the given asyncio event loop using `loop.add_reader()`,
+        so events are handled directly in the loop's thread as they arrive.
+        Returns immediately.
+
+        This requires a pipe-based queue (`multiprocessing.Queue` or
+        `PipeQueue`) and an event loop implementing `add_reader()`, which e.g.
+        the proactor event loop on Windows doesn't. In all other cases, use
+        `threaded_handle_until_closed()` or `coro_handle_until_closed()`.
+        """
+        reader = getattr(self.q, "_reader", None)
+        if reader is None:
+            raise TypeError(
+                "asyncio_handle_until_closed() requires a multiprocessing.Queue"
+                f" or PipeQueue, not {type(self.q).__name__}"
+            )
+        fd = reader.fileno()
+        get_nowait = self.q.get_nowait
+
+        def on_readable():
+            try:
+                obj = get_nowait()
+            except queue.Empty:
+                # another process got there first
+                return
+            if obj is CLOSE_SENTINEL:
+                self.closed = True
+                loop.remove_reader(fd)
+                return
+            self._dispatch(obj)
+
+        loop.add_reader(fd, on_readable)
 
     async def coro_handle_until_closed(self):
         """
@@ -178,16 +574,310 @@ class MpDispatchReceiver:
 
         This means listeners can be called from within the original thread, so
         no `call_via` is required.
+
+        The receiver's own executor used for blocking waits is shut down once
+        the receiver has been closed.
         """
-        with ThreadPoolExecutor() as pool:
-            while not self.closed:
-                await self.coro_handle_next(pool=pool)
+        pool = self._get_executor()
+        while not self.closed:
+            await self.coro_handle_next(pool=pool)
+        self._shutdown_executor()
 
     def close(self, **q_put_kwargs):
         """
         Closes the underlying queue and aborts any blocking calls.
+
+        Calling this more than once has no further effect, unless putting the
+        close request into the queue failed (e.g. with `queue.Full` due to a
+        timeout passed in `q_put_kwargs`). Note that `self.closed` is only set
+        once the close request has actually been received, so events that
+        were sent before it still get handled.
         """
+        if self._close_sent:
+            return
         self.q.put(CLOSE_SENTINEL, **q_put_kwargs)
+        self._close_sent = True
+
+class _FramedQueue:
+    """
+    Base class for queues that transport events as byte frames.
+
+    Frames are either plain pickles or struct frames as produced by
+    `MpDispatchSender.fire()` for signals with a registered schema.
+    Subclasses have to implement `put_bytes()` and `_get_bytes()`.
+    """
+    def __init__(self):
+        # schema ID => (signal, struct format), cf.
+        # MpDispatchSender.register_schema()
+        self._schemas = {}
+        # if not None, struct frames for signals not in here are dropped
+        # without unpacking them (set to its listeners by the receiver)
+        self._wanted = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # listeners are process-local (and often unpicklable); a receiver
+        # re-attaches its own when it's unpickled
+        state["_wanted"] = None
+        return state
+
+    def put(self, obj, block=True, timeout=None):
+        self.put_bytes(ForkingPickler.dumps(obj), block, timeout)
+
+    def get(self, block=True, timeout=None):
+        # frames that don't yield an event (dropped or schema registrations)
+        # mustn't extend the overall timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            data = self._get_bytes(block, timeout)
+            if deadline is not None:
+                timeout = max(0, deadline - monotonic())
+            frame_type = data[0]
+            if frame_type == _FRAME_STRUCT:
+                signal, struct_fmt = self._schemas[
+                    _FRAME_HEADER.unpack_from(data)[1]
+                ]
+                if self._wanted is not None and signal not in self._wanted:
+                    continue
+                return (
+                    signal,
+                    struct.unpack_from(struct_fmt, data, _FRAME_HEADER.size),
+                    {},
+                )
+            if frame_type == _FRAME_SCHEMA:
+                sig_id = _FRAME_HEADER.unpack_from(data)[1]
+                self._schemas[sig_id] = pickle.loads(
+                    data[_FRAME_HEADER.size:]
+                )
+                continue
+            return pickle.loads(data)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+class PipeQueue(_FramedQueue):
+    """
+    Minimal queue for a single sender and a single receiver.
+
+    Implements the subset of the `multiprocessing.Queue` interface used by
+    mpdispatcher on top of a plain `multiprocessing.Pipe`, without the
+    background feeder thread of the former, so each `put()` is just one
+    pickling step and one write to the pipe.
+
+    Writes are serialized by a lock, as messages larger than the pipe's
+    atomic write size would otherwise interleave when the receiving end puts
+    the close sentinel into the queue while the sender is firing events, but
+    there must only ever be one process reading from it.
+
+    Blocking in `get()` happens inside `os.read()` (or `select()` when a
+    timeout is given), both of which release the GIL while waiting, so other
+    threads of the receiving process keep running, e.g. the event loop that a
+    listening thread started by `threaded_handle_until_closed()` calls back
+    into.
+    """
+    def __init__(self):
+        super().__init__()
+        self._reader, self._writer = mp.Pipe(duplex=False)
+        # serializes writers, as besides the sender, the receiver also puts
+        # the close sentinel into the queue when it's closed from its end
+        self._write_lock = mp.Lock()
+
+    def put_bytes(self, data, block=True, timeout=None):
+        """
+        Put an already pickled object or a struct frame into the queue.
+
+        `block` and `timeout` only apply to waiting for other writers, raising
+        `queue.Full` if one is still writing afterwards; once it's this one's
+        turn, writing to the pipe blocks while the pipe's buffer is full.
+        """
+        if not self._write_lock.acquire(block, timeout):
+            raise queue.Full
+        try:
+            self._writer.send_bytes(data)
+        finally:
+            self._write_lock.release()
+
+    def _get_bytes(self, block, timeout):
+        if not block:
+            timeout = 0
+        if timeout is not None and not self._reader.poll(timeout):
+            raise queue.Empty
+        return self._reader.recv_bytes()
+
+# indices into SpscRingTransport._state
+_HEAD, _TAIL, _READER_WAITING, _WRITER_WAITING = range(4)
+_FRAME_LEN = struct.Struct("<I")
+
+class SpscRingTransport(_FramedQueue):
+    """
+    Bounded queue for a single sender and a single receiver using a ring
+    buffer in shared memory.
+
+    Frames are copied straight into shared memory instead of going through a
+    pipe. As the buffer is bounded, a sender that is faster than the receiver
+    blocks in `put()` once `capacity_bytes` are in use, instead of letting the
+    queue grow without limit.
+
+    Waiting sides sleep on a `multiprocessing.Event` that the other side only
+    sets when it's known to be waiting, so there is no polling.
+
+    Writes are serialized by a lock, so it's safe for the receiving end to put
+    the close sentinel into the queue while the sender is firing events, but
+    there must only ever be one process reading from it.
+
+    The shared memory block is released automatically once the transport is
+    garbage collected (or at the latest on exit) in the process that created
+    it, or explicitly by calling `unlink()`. Requires Python 3.8 or higher.
+    """
+    def __init__(self, capacity_bytes=1 << 20):
+        super().__init__()
+        self._capacity = capacity_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=capacity_bytes)
+        # total bytes written & read and flags indicating waiting sides
+        self._state = mp.Array("Q", 4)
+        # serializes writers, as besides the sender, the receiver also puts
+        # the close sentinel into the queue when it's closed from its end
+        self._write_lock = mp.Lock()
+        self._not_empty = mp.Event()
+        self._not_full = mp.Event()
+        # last tail seen by the writing and head seen by the reading side; as
+        # both only ever grow, these are conservative estimates of the free &
+        # used space that can be checked without taking the state lock
+        self._seen_tail = 0
+        self._seen_head = 0
+        self._finalizer = weakref.finalize(
+            self, _release_shared_memory, self._shm, os.getpid()
+        )
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # only the creating process releases the shared memory
+        state["_finalizer"] = None
+        return state
+
+    def unlink(self):
+        """
+        Release the underlying shared memory block early.
+
+        Only has an effect in the process that created the transport and only
+        the first time it's called.
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def put_bytes(self, data, block=True, timeout=None):
+        """
+        Put an already pickled object or a struct frame into the queue.
+
+        Blocks while there isn't enough room in the buffer unless otherwise
+        specified, raising `queue.Full` if it's still full afterwards.
+        """
+        n = _FRAME_LEN.size + len(data)
+        capacity = self._capacity
+        if n > capacity:
+            raise ValueError(
+                f"message of {len(data)} bytes too large for ring buffer"
+            )
+        state, counters = self._state, self._state.get_obj()
+        deadline = None if timeout is None else monotonic() + timeout
+        if not self._write_lock.acquire(block, timeout):
+            raise queue.Full
+        try:
+            # only writers change the head and they're serialized by the lock
+            # we're holding, so no need for the state lock to read it
+            head = counters[_HEAD]
+            if head + n - self._seen_tail > capacity:
+                # the timeout covers waiting for the lock and for room alike
+                if deadline is not None:
+                    timeout = max(deadline - monotonic(), 0)
+                self._seen_tail = self._wait_until(
+                    lambda: counters[_TAIL]
+                    if head + n - counters[_TAIL] <= capacity else None,
+                    _WRITER_WAITING, self._not_full, queue.Full, block,
+                    timeout,
+                )
+            self._write(head, _FRAME_LEN.pack(len(data)))
+            self._write(head + _FRAME_LEN.size, data)
+            with state:
+                counters[_HEAD] = head + n
+                reader_waiting = counters[_READER_WAITING]
+        finally:
+            self._write_lock.release()
+        if reader_waiting:
+            self._not_empty.set()
+
+    def _get_bytes(self, block, timeout):
+        state, counters = self._state, self._state.get_obj()
+        # only the (single) reader changes the tail
+        tail = counters[_TAIL]
+        if self._seen_head == tail:
+            self._seen_head = self._wait_until(
+                lambda: counters[_HEAD] if counters[_HEAD] != tail else None,
+                _READER_WAITING, self._not_empty, queue.Empty, block, timeout,
+            )
+        length, = _FRAME_LEN.unpack(self._read(tail, _FRAME_LEN.size))
+        data = self._read(tail + _FRAME_LEN.size, length)
+        with state:
+            counters[_TAIL] = tail + _FRAME_LEN.size + length
+            writer_waiting = counters[_WRITER_WAITING]
+        if writer_waiting:
+            self._not_full.set()
+        return data
+
+    def _wait_until(self, cond, waiting_idx, event, exc_type, block, timeout):
+        """
+        Wait until `cond()` (evaluated with the state lock held) returns
+        something other than `None` and return that.
+
+        While waiting, the flag at `waiting_idx` is set so the other side knows
+        to set `event` once it has changed the state.
+        """
+        state, counters = self._state, self._state.get_obj()
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            with state:
+                result = cond()
+                if result is not None:
+                    counters[waiting_idx] = 0
+                    return result
+                if not block:
+                    raise exc_type
+                counters[waiting_idx] = 1
+                event.clear()
+            remaining = None if deadline is None else deadline - monotonic()
+            if (remaining is not None and remaining <= 0) \
+               or not event.wait(remaining):
+                with state:
+                    counters[waiting_idx] = 0
+                    result = cond()
+                if result is not None:
+                    return result
+                raise exc_type
+
+    def _write(self, pos, data):
+        buf, capacity = self._shm.buf, self._capacity
+        start = pos % capacity
+        end = start + len(data)
+        if end <= capacity:
+            buf[start:end] = data
+        else:
+            split = capacity - start
+            buf[start:capacity] = data[:split]
+            buf[:end - capacity] = data[split:]
+
+    def _read(self, pos, n):
+        buf, capacity = self._shm.buf, self._capacity
+        start = pos % capacity
+        end = start + n
+        if end <= capacity:
+            return bytes(buf[start:end])
+        return bytes(buf[start:capacity]) + bytes(buf[:end - capacity])
+
+def _release_shared_memory(shm, creator_pid):
+    shm.close()
+    # forked children inherit the finalizer but mustn't unlink
+    if os.getpid() == creator_pid:
+        shm.unlink()
 
 class Closed(Exception):
     pass
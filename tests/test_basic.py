@@ -1,14 +1,17 @@
 import asyncio
-from mpdispatcher import MpDispatcher, Closed
+from mpdispatcher import (
+  MpDispatcher, MpDispatchReceiver, Closed, SpscRingTransport,
+)
 from multiprocessing import Process
 import multiprocessing as mp
 import pytest
+import queue
 import sys
-from time import sleep
+from time import monotonic, sleep
 
-@pytest.fixture()
-def dispatcher():
-  return MpDispatcher()
+@pytest.fixture(params=["mpmc", "spsc", "ring"])
+def dispatcher(request):
+  return MpDispatcher(mode=request.param)
 
 
 def receive_single_event(receiver):
@@ -220,3 +223,506 @@ def test_threaded_handle_until_closed_in_child_proc(dispatcher):
   proc.join(timeout=2)
   assert not proc.is_alive()
   assert proc.exitcode == 0
+
+
+def test_invalid_mode():
+  with pytest.raises(ValueError):
+    MpDispatcher(mode="foo")
+  with pytest.raises(ValueError):
+    MpDispatcher(q=mp.Queue(), mode="spsc")
+
+
+def test_fire_cached_events_keep_arg_types():
+  dispatcher = MpDispatcher(mode="spsc")
+  l = []
+  def cb(arg, kwarg=None):
+    l.append((arg, kwarg))
+  dispatcher.receiver.connect("cb", cb)
+  for arg in [1, True, 1, True]:
+    dispatcher.sender.fire("cb", arg, kwarg=arg)
+  dispatcher.receiver.handle_until_blocking()
+  assert [tuple(map(type, x)) for x in l] == [(int, int), (bool, bool)] * 2
+
+
+def test_multiple_listeners_and_kwargs():
+  dispatcher = MpDispatcher()
+  l = []
+  dispatcher.receiver.connect("cb", lambda arg=None: l.append(("a", arg)))
+  dispatcher.sender.fire("cb", 1)
+  dispatcher.receiver.handle_next(timeout=2)
+  dispatcher.receiver.connect("cb", lambda arg=None: l.append(("b", arg)))
+  dispatcher.sender.fire("cb", arg=2)
+  dispatcher.sender.fire("cb")
+  dispatcher.receiver.handle_next(timeout=2)
+  dispatcher.receiver.handle_next(timeout=2)
+  assert l == [("a", 1), ("a", 2), ("b", 2), ("a", None), ("b", None)]
+
+
+def receive_events_via_loop_reader_and_run_parallel_coro(receiver):
+  l = []
+  def cb(arg):
+    l.append(arg)
+  receiver.connect("cb", cb)
+  async def asyncio_main(receiver):
+    should_stop = asyncio.Event()
+    receiver.connect("stop_coro", should_stop.set)
+    receiver.asyncio_handle_until_closed(asyncio.get_running_loop())
+    await should_stop.wait()
+    while not receiver.closed:
+      await asyncio.sleep(0.01)
+  asyncio.run(asyncio_main(receiver))
+  assert l == [43, 54, 87]
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+  reason="requires python3.7 or higher")
+def test_asyncio_handle_until_closed_in_child_proc(dispatcher):
+  if isinstance(dispatcher.receiver.q, SpscRingTransport):
+    loop = asyncio.new_event_loop()
+    try:
+      with pytest.raises(TypeError, match="SpscRingTransport"):
+        dispatcher.receiver.asyncio_handle_until_closed(loop)
+    finally:
+      loop.close()
+      dispatcher.receiver.q.unlink()
+    return
+  proc = Process(target=receive_events_via_loop_reader_and_run_parallel_coro,
+    args=[dispatcher.receiver])
+  proc.daemon = True
+  proc.start()
+  dispatcher.sender.fire("cb", 43)
+  dispatcher.sender.fire("cb", 54)
+  dispatcher.sender.fire("cb", 87)
+  dispatcher.sender.fire("stop_coro")
+  dispatcher.sender.close()
+  proc.join(timeout=2)
+  assert not proc.is_alive()
+  assert proc.exitcode == 0
+
+
+def test_receiver_executor_is_reused_but_not_pickled(dispatcher):
+  receiver = dispatcher.receiver
+  executor = receiver._get_executor()
+  assert receiver._get_executor() is executor
+  assert receiver.__getstate__()["_executor"] is None
+  executor.shutdown()
+
+
+class ReceiverWithDict(MpDispatchReceiver):
+  pass
+
+
+class ReceiverWithSlots(MpDispatchReceiver):
+  __slots__ = ("extra",)
+
+
+@pytest.mark.parametrize("cls", [ReceiverWithDict, ReceiverWithSlots])
+def test_receiver_subclass_state_is_pickled(cls):
+  receiver = cls(q=mp.Queue())
+  receiver.extra = 1
+  receiver.connect("cb", print)
+  # queues can only be pickled while spawning a process, so just check that
+  # the state survives the round trip
+  copy = cls.__new__(cls)
+  copy.__setstate__(receiver.__getstate__())
+  assert copy.extra == 1
+  assert list(copy.listeners) == ["cb"]
+  assert not copy.closed
+
+def test_repeated_close_sends_single_sentinel(dispatcher):
+  dispatcher.sender.close()
+  dispatcher.sender.close()
+  dispatcher.receiver.close()
+  dispatcher.receiver.close()
+  # one sentinel from each end
+  dispatcher.receiver.q.get(timeout=2)
+  dispatcher.receiver.q.get(timeout=2)
+  with pytest.raises(queue.Empty):
+    dispatcher.receiver.q.get(timeout=0.1)
+
+
+def receive_struct_events_until_closed(receiver):
+  l = []
+  def cb(*args, **kwargs):
+    l.append((args, kwargs))
+  receiver.connect("cb", cb)
+  receiver.handle_until_closed()
+  assert l == [((43, 1.5), {}), ((54, 2.0), {}), (("x",), {}), ((1,), {"a": 2})]
+
+def test_register_schema_in_child_proc():
+  dispatcher = MpDispatcher(mode="spsc")
+  proc = Process(target=receive_struct_events_until_closed,
+    args=[dispatcher.receiver])
+  proc.daemon = True
+  proc.start()
+  assert dispatcher.sender.register_schema("cb", "<id") == 0
+  dispatcher.sender.fire("cb", 43, 1.5)
+  dispatcher.sender.fire("cb", 54, 2)
+  dispatcher.sender.fire("cb", "x")
+  dispatcher.sender.fire("cb", 1, a=2)
+  dispatcher.sender.close()
+  proc.join(timeout=2)
+  assert not proc.is_alive()
+  assert proc.exitcode == 0
+
+def test_register_schema_unsupported():
+  dispatcher = MpDispatcher(mode="mpmc")
+  assert dispatcher.sender.register_schema("cb", "<i") is None
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+  reason="requires python3.8 or higher")
+def test_ring_transport_wraps_around_and_is_bounded():
+  q = SpscRingTransport(capacity_bytes=64)
+  try:
+    for i in range(20):
+      q.put(("cb", (i,), {}))
+      q.put(("cb", (-i,), {}))
+      assert q.get(timeout=2) == ("cb", (i,), {})
+      assert q.get(timeout=2) == ("cb", (-i,), {})
+    q.put_bytes(b"x" * 40)
+    with pytest.raises(queue.Full):
+      q.put_bytes(b"x" * 40, block=False)
+    with pytest.raises(queue.Full):
+      q.put_bytes(b"x" * 40, timeout=0.1)
+    with pytest.raises(ValueError):
+      q.put_bytes(b"x" * 64)
+  finally:
+    q.unlink()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+  reason="requires python3.8 or higher")
+def test_ring_transport_put_and_close_respect_timeout():
+  q = SpscRingTransport(capacity_bytes=64)
+  dispatcher = MpDispatcher(q=q)
+  try:
+    with pytest.raises(queue.Full):
+      for i in range(64):
+        q.put(("cb", (i,), {}), block=False)
+    start = monotonic()
+    with pytest.raises(queue.Full):
+      dispatcher.receiver.close(timeout=0.1)
+    assert monotonic() - start < 1
+    assert [q.get_nowait() for j in range(i)] \
+      == [("cb", (j,), {}) for j in range(i)]
+    dispatcher.receiver.close(timeout=2)
+    with pytest.raises(Closed):
+      dispatcher.receiver.handle_until_blocking()
+  finally:
+    q.unlink()
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+  reason="requires python3.8 or higher")
+def test_ring_transport_put_timeout_includes_waiting_for_lock():
+  import threading
+  q = SpscRingTransport(capacity_bytes=64)
+  try:
+    q.put_bytes(b"x" * 40)
+    q._write_lock.acquire()
+    thread = threading.Timer(0.4, q._write_lock.release)
+    thread.start()
+    start = monotonic()
+    with pytest.raises(queue.Full):
+      q.put_bytes(b"x" * 40, timeout=0.6)
+    assert monotonic() - start < 0.9
+    thread.join()
+  finally:
+    q.unlink()
+
+def test_struct_events_without_listeners_are_dropped():
+  dispatcher = MpDispatcher(mode="spsc")
+  l = []
+  dispatcher.receiver.connect("cb", l.append)
+  dispatcher.sender.register_schema("cb", "<i")
+  dispatcher.sender.register_schema("other", "<i")
+  dispatcher.sender.fire("other", 1)
+  dispatcher.sender.fire("cb", 2)
+  dispatcher.sender.fire("other", 3)
+  assert dispatcher.receiver.q.get(timeout=2) == ("cb", (2,), {})
+  with pytest.raises(queue.Empty):
+    dispatcher.receiver.q.get_nowait()
+  # listeners stay behind when the queue is sent to another process
+  assert dispatcher.receiver.q.__getstate__()["_wanted"] is None
+
+
+def test_close_sentinel_unpickles_to_singleton():
+  import pickle
+  from mpdispatcher import CLOSE_SENTINEL
+  assert pickle.loads(pickle.dumps(CLOSE_SENTINEL)) is CLOSE_SENTINEL
+
+
+def receive_batched_events_until_closed(receiver):
+  l = []
+  l2 = []
+  receiver.connect("cb", lambda *args: l.append(args))
+  receiver.connect("cb2", lambda arg: l2.append(("a", arg)))
+  receiver.connect("cb2", lambda arg: l2.append(("b", arg)))
+  receiver.handle_until_closed()
+  assert l == [(43,), (54, 1), (), (87,)]
+  assert l2 == [("a", 1), ("b", 1), ("a", 2), ("b", 2)]
+
+def test_fire_many_in_child_proc(dispatcher):
+  proc = Process(target=receive_batched_events_until_closed,
+    args=[dispatcher.receiver])
+  proc.daemon = True
+  proc.start()
+  dispatcher.sender.fire("cb", 43)
+  dispatcher.sender.fire_many("cb", [(54, 1), ()])
+  dispatcher.sender.fire_many("cb2", iter([(1,), (2,)]))
+  dispatcher.sender.fire_many("some_nonexistent_event", [(1,)])
+  dispatcher.sender.fire("cb", 87)
+  dispatcher.sender.close()
+  proc.join(timeout=2)
+  assert not proc.is_alive()
+  assert proc.exitcode == 0
+
+
+def test_handle_next_call_via(dispatcher):
+  l = []
+  calls = []
+  def call_via(f, *args):
+    calls.append(f)
+    f(*args)
+  dispatcher.receiver.connect("cb", l.append)
+  dispatcher.sender.fire("cb", 54)
+  dispatcher.receiver.handle_next(call_via=call_via, timeout=2)
+  assert l == [54]
+  assert len(calls) == 1
+
+
+def test_finalize():
+  dispatcher = MpDispatcher(mode="spsc")
+  receiver, sender = dispatcher.receiver, dispatcher.sender
+  l = []
+  receiver.connect("cb", lambda *args, **kwargs: l.append((args, kwargs)))
+  receiver.connect("cb2", lambda arg: l.append(("a", arg)))
+  receiver.connect("cb2", lambda arg: l.append(("b", arg)))
+  receiver.finalize()
+  sender.fire("cb", 1, x=2)
+  sender.fire("cb")
+  sender.fire("cb2", 3)
+  sender.fire_many("cb2", [(4,)])
+  sender.fire("some_nonexistent_event", 5)
+  receiver.handle_until_blocking()
+  assert l == [((1,), {"x": 2}), ((), {}), ("a", 3), ("b", 3), ("a", 4),
+    ("b", 4)]
+  l.clear()
+  receiver.connect("cb3", l.append)
+  sender.fire("cb3", 6)
+  receiver.handle_until_blocking()
+  assert l == [6]
+
+
+def test_fire_cached_events_keep_kwargs_order():
+  dispatcher = MpDispatcher(mode="spsc")
+  l = []
+  dispatcher.receiver.connect("cb", lambda **kwargs: l.append(list(kwargs)))
+  dispatcher.sender.fire("cb", b=1, a=2)
+  dispatcher.sender.fire("cb", a=2, b=1)
+  dispatcher.sender.fire("cb", b=1, a=2)
+  dispatcher.receiver.handle_until_blocking()
+  assert l == [["b", "a"], ["a", "b"], ["b", "a"]]
+
+
+def test_fire_cached_events_bounded():
+  import mpdispatcher
+  dispatcher = MpDispatcher(mode="spsc")
+  l = []
+  dispatcher.receiver.connect("cb", l.append)
+  mpdispatcher._encoded_events.clear()
+  payload = b"x" * 10000
+  dispatcher.sender.fire("cb", payload)
+  dispatcher.receiver.handle_until_blocking()
+  assert l == [payload]
+  assert not mpdispatcher._encoded_events
+  for i in range(mpdispatcher._MAX_CACHED_EVENTS + 10):
+    dispatcher.sender.fire("cb", i)
+    dispatcher.receiver.handle_until_blocking()
+  assert len(mpdispatcher._encoded_events) == mpdispatcher._MAX_CACHED_EVENTS
+
+def test_handle_until_blocking_on_close(dispatcher):
+  l = []
+  dispatcher.receiver.connect("cb", l.append)
+  dispatcher.sender.fire("cb", 54)
+  dispatcher.sender.close()
+  sleep(0.1)  # let mp.Queue's feeder thread catch up
+  with pytest.raises(Closed):
+    dispatcher.receiver.handle_until_blocking()
+  assert l == [54]
+  assert dispatcher.receiver.closed
+
+
+def test_register_schema_again():
+  dispatcher = MpDispatcher(mode="spsc")
+  l = []
+  dispatcher.receiver.connect("a", lambda *args: l.append(("a", args)))
+  dispatcher.receiver.connect("b", lambda *args: l.append(("b", args)))
+  sender = dispatcher.sender
+  assert sender.register_schema("a", "<i") == 0
+  sender.fire("a", 1)
+  assert sender.register_schema("a", "<q") == 1
+  assert sender.register_schema("b", "<d") == 2
+  sender.fire("a", 5)
+  sender.fire("b", 2.5)
+  dispatcher.receiver.handle_until_blocking()
+  assert l == [("a", (1,)), ("a", (5,)), ("b", (2.5,))]
+
+def test_register_schema_limit():
+  dispatcher = MpDispatcher(mode="spsc")
+  dispatcher.sender._next_schema_id = 0x10000
+  with pytest.raises(ValueError):
+    dispatcher.sender.register_schema("a", "<i")
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+  reason="requires python3.8 or higher")
+def test_ring_transport_concurrent_writers():
+  import threading
+  for trial in range(20):
+    dispatcher = MpDispatcher(mode="ring")
+    try:
+      def fire_all():
+        for i in range(300):
+          dispatcher.sender.fire("cb", i)
+      thread = threading.Thread(target=fire_all)
+      thread.start()
+      dispatcher.receiver.close()
+      thread.join()
+      l = []
+      dispatcher.receiver.connect("cb", l.append)
+      with pytest.raises(Closed):
+        dispatcher.receiver.handle_until_blocking()
+      while True:
+        try:
+          l.append(dispatcher.receiver.q.get_nowait()[1][0])
+        except queue.Empty:
+          break
+      assert sorted(l) == list(range(300))
+    finally:
+      dispatcher.sender.q.unlink()
+
+
+def test_pipe_transport_concurrent_writers():
+  from mpdispatcher import CLOSE_SENTINEL
+  import threading
+  payload = b"x" * 200000
+  for trial in range(5):
+    dispatcher = MpDispatcher(mode="spsc")
+    def fire_all():
+      for i in range(20):
+        dispatcher.sender.fire("cb", i, payload)
+    thread = threading.Thread(target=fire_all)
+    thread.start()
+    # large messages don't fit into the pipe buffer, so read concurrently
+    closer = threading.Thread(target=dispatcher.receiver.close)
+    closer.start()
+    l = []
+    closed = False
+    while len(l) < 20 or not closed:
+      obj = dispatcher.receiver.q.get(timeout=5)
+      if obj is CLOSE_SENTINEL:
+        closed = True
+      else:
+        assert obj[1][1] == payload
+        l.append(obj[1][0])
+    thread.join()
+    closer.join()
+    assert sorted(l) == list(range(20))
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+  reason="requires python3.8 or higher")
+def test_ring_transport_releases_shared_memory():
+  import gc
+  from multiprocessing import shared_memory
+  q = SpscRingTransport(capacity_bytes=64)
+  name = q._shm.name
+  q.unlink()
+  q.unlink()
+  with pytest.raises(FileNotFoundError):
+    shared_memory.SharedMemory(name=name)
+  q = SpscRingTransport(capacity_bytes=64)
+  name = q._shm.name
+  del q
+  gc.collect()
+  with pytest.raises(FileNotFoundError):
+    shared_memory.SharedMemory(name=name)
+
+
+def test_dropped_struct_frames_dont_extend_timeout():
+  import threading
+  dispatcher = MpDispatcher(mode="spsc")
+  dispatcher.receiver.connect("cb", lambda arg: None)
+  dispatcher.sender.register_schema("other", "<i")
+  stop = threading.Event()
+  def fire_unlistened():
+    for i in range(200):
+      if stop.is_set():
+        break
+      dispatcher.sender.fire("other", 1)
+      sleep(0.01)
+  thread = threading.Thread(target=fire_unlistened)
+  thread.start()
+  try:
+    start = monotonic()
+    with pytest.raises(queue.Empty):
+      dispatcher.receiver.q.get(timeout=0.2)
+    assert monotonic() - start < 1
+  finally:
+    stop.set()
+    thread.join()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+  reason="requires python3.7 or higher")
+def test_threaded_handle_until_closed_with_raising_listener(dispatcher):
+  l = []
+  def cb(arg):
+    l.append(arg)
+    if arg == 1:
+      raise RuntimeError("listener failure")
+  dispatcher.receiver.connect("cb", cb)
+  async def asyncio_main():
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda loop, context: None)
+    for i in range(3):
+      dispatcher.sender.fire("cb", i)
+    sleep(0.1)  # make sure the first events arrive as one burst
+    dispatcher.receiver.threaded_handle_until_closed(
+      call_via=loop.call_soon_threadsafe)
+    for i in range(100):
+      if len(l) >= 2:
+        break
+      await asyncio.sleep(0.01)
+    for i in range(3, 6):
+      dispatcher.sender.fire("cb", i)
+    dispatcher.sender.close()
+    for i in range(200):
+      if dispatcher.receiver.closed and len(l) == 6:
+        break
+      await asyncio.sleep(0.01)
+  asyncio.run(asyncio_main())
+  assert l == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+  reason="requires python3.7 or higher")
+def test_receiver_executor_is_shut_down_once_closed(dispatcher):
+  receiver = dispatcher.receiver
+  async def asyncio_main():
+    loop = asyncio.get_running_loop()
+    receiver.threaded_handle_until_closed(call_via=loop.call_soon_threadsafe)
+    executor = receiver._executor
+    dispatcher.sender.close()
+    for i in range(200):
+      if receiver._executor is None:
+        break
+      await asyncio.sleep(0.01)
+    assert receiver._executor is None
+    assert executor._shutdown
+    receiver.closed = False
+    dispatcher.sender.closed = False
+    dispatcher.sender.close()
+    await receiver.coro_handle_until_closed()
+    assert receiver._executor is None
+  asyncio.run(asyncio_main())